@@ -4,7 +4,7 @@ import os
 import os.path
 
 install_file = 'torrentinfo.py'
-if os.name is 'posix':
+if os.name == 'posix':
     src_path = os.path.abspath('src')
     file_path = os.path.join(src_path, 'torrentinfo')
     if os.path.exists(file_path):
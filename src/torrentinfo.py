@@ -26,12 +26,27 @@ import sys
 import argparse
 import os.path
 import time
+from collections import deque
+from itertools import islice
+
+if sys.version_info[0] == 2:
+    from StringIO import StringIO
+else:
+    from io import StringIO
+    from sys import intern
 
 #  see pylint ticket #2481
 from string import printable  # pylint: disable-msg=W0402
 
 VERSION = '1.8.7'
 
+PRINTABLE_SET = frozenset(printable)
+SAMPLE_THRESHOLD = 4096
+SAMPLE_SIZE = 64
+MAX_READERS = 32
+SIZE_UNITS = ('B', 'KB', 'MB', 'GB')
+STREAM_THRESHOLD = 65536
+
 class TextFormatter:
     """Class used to format strings before printing."""
     NONE = 0x000000
@@ -59,6 +74,7 @@ class TextFormatter:
 
     def __init__(self, colour):
         self.colour = colour
+        self.code_cache = dict()
 
     def string_format(self, format_spec, config, string=''):
         """Attaches colour codes to strings before outputting them.
@@ -69,12 +85,14 @@ class TextFormatter:
         :type string: str
         """
         if self.colour:
-            codestring = ''
-            for name, code in TextFormatter.mapping:
-                if format_spec & name:
-                    codestring += TextFormatter.escape + code
+            codestring = self.code_cache.get(format_spec)
+            if codestring is None:
+                codestring = ''.join(TextFormatter.escape + code
+                                     for name, code in TextFormatter.mapping
+                                     if format_spec & name)
+                self.code_cache[format_spec] = codestring
             config.out.write(codestring + string)
-        else:
+        elif string:
             config.out.write(string)
 
 class Config:
@@ -97,6 +115,45 @@ class Config:
         self.out = out
         self.err = err
         self.tab_char = tab_char
+        self.indents = Indents(tab_char)
+
+
+class Indents(dict):
+    """Class mapping indentation depths to indentation strings, which are
+    built on first use and reused afterwards."""
+
+    def __init__(self, tab_char):
+        """Initialises an indentation cache.
+
+        :param tab_char: character to use as a tab
+        :type tab_char: str
+        """
+        super(Indents, self).__init__()
+        self.tab_char = tab_char
+
+    def __missing__(self, depth):
+        indent = self[depth] = self.tab_char * depth
+        return indent
+
+
+class OutputBuffer(StringIO):
+    """In-memory output which is passed on to a stream when flushed."""
+
+    def __init__(self, stream):
+        """Initialises an output buffer.
+
+        :param stream: destination of the buffered output
+        :type stream: file
+        """
+        StringIO.__init__(self)
+        self.stream = stream
+
+    def flush(self):
+        """Writes out and discards everything buffered so far."""
+        self.stream.write(self.getvalue())
+        self.stream.flush()
+        self.seek(0)
+        self.truncate()
 
 
 class Torrent(dict):
@@ -105,12 +162,41 @@ class Torrent(dict):
     def __init__(self, filename, string_buffer):
         tmp_dict = decode(string_buffer)
 
-        if type(tmp_dict) != dict:
+        if not isinstance(tmp_dict, dict):
             raise UnexpectedType(self.__class__, dict)
 
         super(Torrent, self).__init__(tmp_dict)
         self.filename = filename
+        self.offsets = None
+        self.total = None
+
+    def file_offsets(self):
+        """Gets the offset of every file in a multi-file torrent.
 
+        The offsets are prefix sums of the file lengths, computed in a
+        single pass on first use and cached afterwards together with the
+        total length.
+
+        :returns: list -- int offset of each file
+        """
+        if self.offsets is None:
+            self.offsets = []
+            total = 0
+            for filetorrent in self['info']['files']:
+                self.offsets.append(total)
+                total += filetorrent['length']
+            self.total = total
+        return self.offsets
+
+    def total_length(self):
+        """Gets the combined length of every file in a multi-file torrent,
+        as found by the pass that computes `file_offsets`.
+
+        :returns: int
+        """
+        if self.total is None:
+            self.file_offsets()
+        return self.total
 
 class UnexpectedType(Exception):
     """Thrown when the torrent file is not just a single dictionary"""
@@ -120,6 +206,18 @@ class UnknownTypeChar(Exception):
     """Thrown when Torrent.parse encounters unexpected character"""
     pass
 
+def write_error(config, message):
+    """Writes an error message, flushing the output written before it
+    first so that both appear in order.
+
+    :param config: configuration object to use in this method
+    :type config: Config
+    :param message: error message to write
+    :type message: str
+    """
+    config.out.flush()
+    config.err.write(message)
+
 def dump_as_date(number, config):
     """Dumps out the Integer instance as a date.
 
@@ -143,15 +241,15 @@ def dump_as_size(number, config, depth):
     :param depth: indentation depth
     :type depth: int
     """
-    size = float(number)
-    sizes = ['B', 'KB', 'MB', 'GB']
-    while size >= 1024 and len(sizes) > 1:
-        size /= 1024
-        sizes = sizes[1:]
+    # The bit length is taken from bin() as int.bit_length is missing on
+    # Python 2.6; the '0b' prefix accounts for the two extra characters.
+    bits = len(bin(max(number, 1))) - 2
+    unit = min((bits - 1) // 10, len(SIZE_UNITS) - 1)
     config.formatter.string_format(TextFormatter.CYAN, config,
                                    '%s%.1f%s\n' % (
-                                       config.tab_char * depth,
-                                       size, sizes[0]))
+                                       config.indents[depth],
+                                       number / float(1 << (10 * unit)),
+                                       SIZE_UNITS[unit]))
 
 
 
@@ -169,88 +267,149 @@ def dump(item, config, depth, newline=True, as_utf_repr=False):
     :param as_utf_repr: indicates whether only ASCII should be printed
     :type as_utf_repr: bool
     """
-    def teq(comp_type):
-        """Helper that checks for type equality."""
-        return type(item) == comp_type
-
-    if teq(dict) or teq(Torrent):
-        for key in sorted(item):
+    # Leaves are far more common than containers, so they are tested first.
+    if isinstance(item, str):
+        if not as_utf_repr or is_ascii_only(item):
+            if len(item) > STREAM_THRESHOLD:
+                # Written in parts to avoid copying a huge string just to
+                # attach the indentation and newline to it.
+                config.formatter.string_format(TextFormatter.NONE, config,
+                                               config.indents[depth])
+                config.formatter.string_format(TextFormatter.NONE,
+                                               config, item)
+                if newline:
+                    config.formatter.string_format(TextFormatter.NONE,
+                                                   config, '\n')
+            else:
+                str_output = '%s%s%s' % (
+                    config.indents[depth], item, '\n' if newline else '')
+                config.formatter.string_format(TextFormatter.NONE,
+                                               config, str_output)
+        else:
+            str_output = '%s[%d UTF-8 Bytes]%s' % (
+                config.indents[depth], len(item), '\n' if newline else '')
             config.formatter.string_format(
-                TextFormatter.NORMAL | TextFormatter.GREEN, config)
-
-            if depth < 2:
-                config.formatter.string_format(TextFormatter.BRIGHT, config)
-
+                TextFormatter.BRIGHT | TextFormatter.RED, config, str_output)
+    elif isinstance(item, int):
+        config.formatter.string_format(
+            TextFormatter.CYAN, config,
+            '%s%d\n' % (config.indents[depth], item))
+    elif isinstance(item, dict):
+        key_format = TextFormatter.NORMAL | TextFormatter.GREEN
+        if depth < 2:
+            key_format |= TextFormatter.BRIGHT
+        for key in sorted(item):
+            config.formatter.string_format(key_format, config)
             dump(key, config, depth, as_utf_repr=as_utf_repr)
             config.formatter.string_format(TextFormatter.NORMAL, config)
             if key == 'pieces':
                 dump(item[key], config, depth + 1, as_utf_repr=True)
             else:
                 dump(item[key], config, depth + 1, as_utf_repr=as_utf_repr)
-    elif teq(list):
+    elif isinstance(item, list):
         if len(item) == 1:
             dump(item[0], config, depth, as_utf_repr=as_utf_repr)
         else:
-            for index in range(len(item)):
+            for index, element in enumerate(item):
                 config.formatter.string_format(TextFormatter.BRIGHT |
                                                TextFormatter.YELLOW,
                                                config,
-                                               '%s%d\n' % (config.tab_char
-                                                           * depth, index))
+                                               '%s%d\n' % (
+                                                   config.indents[depth],
+                                                   index))
                 config.formatter.string_format(TextFormatter.NORMAL, config)
-                dump(item[index], config, depth + 1, as_utf_repr=as_utf_repr)
-    elif teq(str):
-        if is_ascii_only(item) or not as_utf_repr:
-            str_output = '%s%s' % (
-                config.tab_char * depth, item) + ('\n' if newline else '')
-            config.formatter.string_format(TextFormatter.NONE,
-                                           config, str_output)
-        else:
-            str_output = '%s[%d UTF-8 Bytes]' % (
-                config.tab_char * depth, len(item)) + ('\n' if newline else '')
-            config.formatter.string_format(
-                TextFormatter.BRIGHT | TextFormatter.RED, config, str_output)
-    elif teq(int):
-        config.formatter.string_format(
-            TextFormatter.CYAN, config,
-            '%s%d\n' % (config.tab_char * depth, item))
+                dump(element, config, depth + 1, as_utf_repr=as_utf_repr)
 
     else:
-        config.err.write("Don't know how to print %s" % str(item))
+        write_error(config, "Don't know how to print %s" % str(item))
         sys.exit(1)
 
-def decode(string_buffer):
+def decode(string_buffer, replacement='×'):
     """Decodes a bencoded string.
 
+    The buffer is walked with a local cursor and an explicit stack of
+    open containers rather than by recursion, so deeply nested input
+    can not exhaust the interpreter stack. Dictionary keys are interned
+    so that the keys repeated in every entry of a large files list share
+    a single string object.
+
     :param string_buffer: bencoded torrent file content buffer
     :type string_buffer: StringBuffer
+    :param replacement: Replacement character to use if unicode decode fails
+    :type replacement: str
 
     :returns: dict
+    :raises: `UnknownTypeChar`, `StringBuffer.BufferOverrun`,
+             `StringBuffer.CharacterExpected`
     """
-    content_type = string_buffer.peek()
-
-    if content_type == 'd':
-        string_buffer.get(1)
-        tmp_dict = dict()
-        while string_buffer.peek() != 'e':
-            key = string_buffer.get(int(string_buffer.get_upto(':')))
-            tmp_dict[key] = decode(string_buffer)
-        string_buffer.get(1)
-        return tmp_dict
-    elif content_type == 'l':
-        string_buffer.get(1)
-        tmp_list = list()
-        while string_buffer.peek() != 'e':
-            tmp_list.append(decode(string_buffer))
-        string_buffer.get(1)
-        return tmp_list
-    elif content_type == 'i':
-        string_buffer.get(1)
-        return int(string_buffer.get_upto('e'))
-    elif content_type in [str(x) for x in range(0, 10)]:
-        return string_buffer.get(int(string_buffer.get_upto(':')))
-
-    raise UnknownTypeChar(content_type, string_buffer)
+    data = string_buffer.string
+    length = string_buffer.string_length
+    pos = string_buffer.taken
+    find = data.find
+    # Byte strings are already str on Python 2 and are kept as they are.
+    as_text = not isinstance(data, str)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    container = None
+    key = None
+
+    try:
+        while True:
+            content_type = data[pos:pos + 1]
+            expect_key = key is None and type(container) is dict
+
+            if content_type == b'e' and container is not None and key is None:
+                pos += 1
+                value = container
+                container, key = pop()
+            elif content_type == b'd' and not expect_key:
+                pos += 1
+                push((container, key))
+                container, key = dict(), None
+                continue
+            elif content_type == b'l' and not expect_key:
+                pos += 1
+                push((container, key))
+                container, key = list(), None
+                continue
+            elif content_type == b'i' and not expect_key:
+                end = find(b'e', pos)
+                if end < 0:
+                    raise StringBuffer.CharacterExpected('e')
+                value = int(data[pos + 1:end])
+                pos = end + 1
+            elif b'0' <= content_type <= b'9':
+                end = find(b':', pos)
+                if end < 0:
+                    raise StringBuffer.CharacterExpected(':')
+                start = end + 1
+                pos = start + int(data[pos:end])
+                if pos > length:
+                    raise StringBuffer.BufferOverrun(pos - length)
+                value = data[start:pos]
+                if as_text:
+                    try:
+                        value = value.decode('utf-8')
+                    except UnicodeDecodeError:
+                        value = replacement * (pos - start)
+            elif not content_type:
+                raise StringBuffer.BufferOverrun(1)
+            else:
+                raise UnknownTypeChar(content_type.decode('utf-8', 'replace'),
+                                      string_buffer)
+
+            if container is None:
+                return value
+            elif key is not None:
+                container[key] = value
+                key = None
+            elif type(container) is dict:
+                key = intern(value)
+            else:
+                container.append(value)
+    finally:
+        string_buffer.taken = pos
 
 
 def load_torrent(filename):
@@ -261,20 +420,67 @@ def load_torrent(filename):
 
     :returns: StringBuffer
     """
-    file_value = open(filename, 'rb').read()
+    with open(filename, 'rb') as handle:
+        file_value = handle.read()
     if len(file_value) == 0:
         raise UnknownTypeChar('', StringBuffer(''))
 
     return StringBuffer(file_value)
 
+def load_torrents(filenames):
+    """Loads file contents from several torrent files, reading ahead.
+
+    When more than one file is given the files are read on a pool of
+    threads, so that waiting on the disk overlaps with parsing and
+    printing the torrents before them. At most `MAX_READERS` files are
+    read ahead of the one being yielded.
+
+    :param filenames: torrent file paths
+    :type filenames: list
+
+    :returns: generator of StringBuffer, in the order of `filenames`
+    """
+    executor = None
+    if len(filenames) > 1:
+        try:
+            # Imported here so that its import time is only paid when
+            # several files are given.
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(max_workers=min(MAX_READERS,
+                                                          len(filenames)))
+        except ImportError:
+            pass
+
+    if executor is None:
+        for filename in filenames:
+            yield load_torrent(filename)
+        return
+
+    names = iter(filenames)
+    pending = deque()
+    try:
+        for filename in islice(names, MAX_READERS):
+            pending.append(executor.submit(load_torrent, filename))
+        while pending:
+            future = pending.popleft()
+            for filename in islice(names, 1):
+                pending.append(executor.submit(load_torrent, filename))
+            yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
 class StringBuffer:
     """String processing class."""
     def __init__(self, string):
         """Creates an instance of StringBuffer.
 
         :param string: string to use to create the StringBuffer
-        :type string: str
+        :type string: str or bytes
         """
+        if not isinstance(string, bytes):
+            string = string.encode('utf-8')
         self.string = string
         self.string_length = len(self.string)
         self.taken = 0
@@ -297,17 +503,16 @@ class StringBuffer:
             raise StringBuffer.BufferOverrun(1)
         if length > self.string_length - self.taken:
             raise StringBuffer.BufferOverrun(length - (self.string_length - self.taken))
+        ret_val = self.string[self.taken : self.taken + length]
+        if destructive:
+            self.taken += length
+        if isinstance(ret_val, str):
+            return ret_val
         try:
-            ret_val = self.string[self.taken : self.taken + length]
-            if destructive:
-                self.taken += length
-            if type(ret_val) == str:
-                return ret_val
             return ret_val.decode('utf-8')
         except UnicodeDecodeError:
             return replacement * length
 
-
     def is_eof(self):
         """Checks whether we're at the end of the string.
 
@@ -344,13 +549,12 @@ class StringBuffer:
         :returns: str -- collected string from the buffer up to `character`
         :raises: CharacterExpected
         """
-        string_buffer = ''
-        while not self.is_eof():
-            next_char = self.get(1)
-            if next_char == character:
-                return string_buffer
-            string_buffer += next_char
-        raise StringBuffer.CharacterExpected(character)
+        index = self.string.find(character.encode('utf-8'), self.taken)
+        if index < 0:
+            raise StringBuffer.CharacterExpected(character)
+        string_buffer = self.get(index - self.taken)
+        self.taken += 1
+        return string_buffer
 
     class BufferOverrun (Exception):
         """Raised when the buffer goes past EOF."""
@@ -409,7 +613,7 @@ def start_line(config, prefix, depth, postfix='',
     """
     config.formatter.string_format(TextFormatter.BRIGHT | TextFormatter.GREEN,
                                    config, '%s%s'
-                                   % (config.tab_char * depth, prefix))
+                                   % (config.indents[depth], prefix))
     config.formatter.string_format(format_spec, config, '%s%s'
                                    % (config.tab_char, postfix))
 
@@ -435,7 +639,7 @@ def get_line(config, prefix, key, torrent, is_date=False):
     start_line(config, prefix, 1, format_spec=TextFormatter.NORMAL)
     if key in torrent:
         if is_date:
-            if type(torrent[key]) == int:
+            if isinstance(torrent[key], int):
                 dump_as_date(torrent[key], config)
             else:
                 config.formatter.string_format(TextFormatter.BRIGHT |
@@ -457,12 +661,12 @@ def is_ascii_only(string):
 
     :returns: bool
     """
-    is_ascii = True
-    for char in string:
-        if char not in printable:
-            is_ascii = False
-            break
-    return is_ascii
+    # Large strings are usually binary blobs such as `pieces', so a short
+    # prefix is checked first to reject them without a full scan.
+    if (len(string) >= SAMPLE_THRESHOLD and
+            not PRINTABLE_SET.issuperset(string[:SAMPLE_SIZE])):
+        return False
+    return PRINTABLE_SET.issuperset(string)
 
 
 def basic(config, torrent):
@@ -474,7 +678,8 @@ def basic(config, torrent):
     :type torrent: Torrent
     """
     if not 'info' in torrent:
-        config.err.write('Missing "info" section in %s' % torrent.filename)
+        write_error(config,
+                    'Missing "info" section in %s' % torrent.filename)
         sys.exit(1)
     get_line(config, 'name       ', 'name', torrent['info'])
     get_line(config, 'comment    ', 'comment', torrent)
@@ -493,7 +698,8 @@ def top(config, torrent):
     :type torrent: Torrent
     """
     if not 'info' in torrent:
-        config.err.write('Missing "info" section in %s' % torrent.filename)
+        write_error(config,
+                    'Missing "info" section in %s' % torrent.filename)
         sys.exit(1)
 
     local_config = Config(config.formatter,
@@ -511,7 +717,8 @@ def basic_files(config, torrent):
     :type torrent: Torrent
     """
     if not 'info' in torrent:
-        config.err.write('Missing "info" section in %s' % torrent.filename)
+        write_error(config,
+                    'Missing "info" section in %s' % torrent.filename)
         sys.exit(1)
 
     local_config = Config(config.formatter,
@@ -526,10 +733,8 @@ def basic_files(config, torrent):
         numfiles = len(filestorrent)
         if numfiles > 1:
             start_line(config, 'num files  ', 1, '%d\n' % numfiles)
-            lengths = [filetorrent['length']
-                       for filetorrent in filestorrent]
             start_line(config, 'total size ', 1)
-            dump_as_size(sum(lengths), local_config, 0)
+            dump_as_size(torrent.total_length(), local_config, 0)
         else:
             get_line(config, 'file name  ', 'path', filestorrent[0])
             start_line(config, 'file size  ', 1)
@@ -547,40 +752,38 @@ def list_files(config, torrent, detailed=False):
     :param detailed: bool
     """
     if not 'info' in torrent:
-        config.err.write('Missing "info" section in %s' % torrent.filename)
+        write_error(config,
+                    'Missing "info" section in %s' % torrent.filename)
         sys.exit(1)
     start_line(config, 'files', 1, postfix='\n')
     if not 'files' in torrent['info']:
         config.formatter.string_format(TextFormatter.YELLOW |
                                 TextFormatter.BRIGHT, config,
-                                '%s%d' % (config.tab_char * 2, 0))
+                                '%s%d' % (config.indents[2], 0))
         config.formatter.string_format(TextFormatter.NORMAL, config, '\n')
         dump(torrent['info']['name'], config, 3)
         dump_as_size(torrent['info']['length'], config, 3)
     else:
         filestorrent = torrent['info']['files']
-        for index in range(len(filestorrent)):
+        indent = config.indents[2]
+        for index, entry in enumerate(filestorrent):
             config.formatter.string_format(TextFormatter.YELLOW |
                                            TextFormatter.BRIGHT,
-                                           config,
-                                           '%s%d' % (config.tab_char * 2,
-                                                     index))
+                                           config, '%s%d' % (indent, index))
 
 
             config.formatter.string_format(TextFormatter.NORMAL, config, '\n')
             if detailed:
-                for kwrd in sorted(filestorrent[index], reverse=True):
+                for kwrd in sorted(entry, reverse=True):
                     start_line(config, kwrd, 3, postfix='\n')
-                    dump(filestorrent[index][kwrd], config, 4)
+                    dump(entry[kwrd], config, 4)
             else:
-                if type(filestorrent[index]['path']) == str:
-                    dump(filestorrent[index]['path'], config, 3)
+                if isinstance(entry['path'], str):
+                    dump(entry['path'], config, 3)
 
                 else:
-                    dump(os.path.join(*filestorrent[index]['path']),
-                         config, 3)
-                    dump_as_size(filestorrent[index]['length'],
-                                 config, 3)
+                    dump('/'.join(entry['path']), config, 3)
+                    dump_as_size(entry['length'], config, 3)
 
     if detailed:
         start_line(config, 'piece length', 1, postfix='\n')
@@ -595,31 +798,40 @@ def main(alt_args=None, out=sys.stdout, err=sys.stderr):
         args = get_arg_parser().parse_args() if alt_args is None else alt_args
         formatter = TextFormatter(not args.nocolour)
         config = Config(formatter, out=out, err=err, tab_char='    ')
-        for filename in args.filename:
-            try:
-                torrent = Torrent(filename, load_torrent(filename))
-                config.formatter.string_format(TextFormatter.BRIGHT, config,
-                                               '%s\n' % os.path.basename(
-                                                   torrent.filename))
-
-                if args.everything:
-                    dump(torrent, config, 1)
-                elif args.detailed:
-                    list_files(config, torrent, detailed=True)
-                elif args.files:
-                    basic(config, torrent)
-                    list_files(config, torrent, detailed=False)
-                elif args.top:
-                    top(config, torrent)
-                else:
-                    basic(config, torrent)
-                    basic_files(config, torrent)
-                config.formatter.string_format(TextFormatter.NORMAL,
-                                               config, '\n')
-            except UnknownTypeChar:
-                err.write(
-                    'Could not parse %s as a valid torrent file.\n' % filename)
-                sys.exit(1)
+        buffers = load_torrents(args.filename)
+        try:
+            for filename in args.filename:
+                # Output for each torrent is collected in memory and written
+                # out in one go rather than with a write per token.
+                config.out = OutputBuffer(out)
+                try:
+                    torrent = Torrent(filename, next(buffers))
+                    config.formatter.string_format(
+                        TextFormatter.BRIGHT, config,
+                        '%s\n' % os.path.basename(torrent.filename))
+
+                    if args.everything:
+                        dump(torrent, config, 1)
+                    elif args.detailed:
+                        list_files(config, torrent, detailed=True)
+                    elif args.files:
+                        basic(config, torrent)
+                        list_files(config, torrent, detailed=False)
+                    elif args.top:
+                        top(config, torrent)
+                    else:
+                        basic(config, torrent)
+                        basic_files(config, torrent)
+                    config.formatter.string_format(TextFormatter.NORMAL,
+                                                   config, '\n')
+                except UnknownTypeChar:
+                    write_error(config, 'Could not parse %s as a valid '
+                                'torrent file.\n' % filename)
+                    sys.exit(1)
+                finally:
+                    config.out.flush()
+        finally:
+            buffers.close()
     except KeyboardInterrupt:
         pass
 
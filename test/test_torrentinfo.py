@@ -149,6 +149,16 @@ class TextFormatterTest(unittest.TestCase):
         output = self.out.getvalue()
         self.assertEqual(output, '1.0MB\n')
 
+    def test_size_unit_boundaries(self):
+        for size, expected in [(0, '0.0B'), (1023, '1023.0B'),
+                               (1024, '1.0KB'), (1536, '1.5KB'),
+                               (5 * 1024 ** 4, '5120.0GB')]:
+            out = StringIO()
+            config = torrentinfo.Config(torrentinfo.TextFormatter(False),
+                                        out=out)
+            torrentinfo.dump_as_size(size, config, 0)
+            self.assertEqual(out.getvalue(), expected + '\n')
+
     def test_size_fail(self):
         size = 1024
         torrentinfo.dump_as_size(size, self.config, 0)
@@ -209,6 +219,12 @@ class StringBufferTest(unittest.TestCase):
         self.assertEqual(s.get_upto('d'), 'abc',
                          "get_upto('d') failed to get `abc' with `abcdef'")
 
+    def test_get_upto_consumes_character(self):
+        s = torrentinfo.StringBuffer('12:foo')
+        s.get_upto(':')
+        self.assertEqual(s.get(3), 'foo',
+                         "get_upto(':') did not consume the `:' in `12:foo'")
+
     def test_get_upto_character_expected(self):
         s = torrentinfo.StringBuffer('abcdef')
         self.assertRaises(torrentinfo.StringBuffer.CharacterExpected,
@@ -247,6 +263,14 @@ class GenericTorrentTest(unittest.TestCase):
         self.assertRaises(torrentinfo.StringBuffer.BufferOverrun,
                           torrentinfo.decode, bogus_data)
 
+    def test_parse_deeply_nested(self):
+        depth = 100000
+        data = torrentinfo.StringBuffer('l' * depth + 'e' * depth)
+        item = torrentinfo.decode(data)
+        for _ in range(depth - 1):
+            item = item[0]
+        self.assertEqual(item, [])
+
     def test_tracker_succeed(self):
         self.assertEqual(self.torrent['announce'],
                          'fake.com/announce')
@@ -325,6 +349,38 @@ class MultiMegabyteTorrentTest(GenericTorrentTest, GenericOutputTest):
         self.torrent = torrentinfo.Torrent(self.file['path'],
                                            torrentinfo.load_torrent(self.file['path']))
 
+    def test_file_offsets(self):
+        self.assertEqual(self.torrent.file_offsets(), [0, 1048576])
+
+    def test_total_length(self):
+        self.assertEqual(self.torrent.total_length(), 3145728)
+
+    def test_file_keys_shared(self):
+        first, second = self.torrent['info']['files']
+        for key in first:
+            self.assertTrue(any(key is other for other in second))
+
+class LoadTorrentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.paths = [os.path.join('test', 'files', name)
+                      for name in ('regular.torrent', 'unicode.torrent',
+                                   'multi_bytes.torrent')]
+
+    def test_order_past_read_ahead(self):
+        paths = self.paths * torrentinfo.MAX_READERS
+        buffers = torrentinfo.load_torrents(paths)
+        self.assertEqual([buf.string for buf in buffers],
+                         [torrentinfo.load_torrent(path).string
+                          for path in paths])
+
+    def test_close_early(self):
+        buffers = torrentinfo.load_torrents(self.paths * 2)
+        self.assertEqual(next(buffers).string,
+                         torrentinfo.load_torrent(self.paths[0]).string)
+        buffers.close()
+        self.assertRaises(StopIteration, next, buffers)
+
 class MissingInfoTest(unittest.TestCase):
 
     def setUp(self):
@@ -469,6 +525,30 @@ class CommandLineOutputTest(unittest.TestCase):
         assert self.err.getvalue() == ''
         self.assertEqual(self.out.getvalue(), return_string)
 
+    def test_top_several(self):
+        tnames = ['regular.torrent', 'multi_bytes.torrent']
+        ns = self.arg_namespace('-n -t %s' % ' '.join(
+            self.torrent_path(tname) for tname in tnames))
+
+        return_string = '\n'.join([tnames[0],
+                                   'torrentinfo.py',
+                                   tnames[1],
+                                   'multibyte\n'])
+
+        torrentinfo.main(alt_args=ns, out=self.out, err=self.err)
+        assert self.err.getvalue() == ''
+        self.assertEqual(self.out.getvalue(), return_string)
+
+    def test_error_after_output(self):
+        tname = 'missing_info.torrent'
+        ns = self.arg_namespace('-n %s' % self.torrent_path(tname))
+
+        return_string = '%s\nMissing "info" section in %s' % (
+            tname, self.torrent_path(tname))
+
+        self.assertRaises(SystemExit, torrentinfo.main,
+                          alt_args=ns, out=self.out, err=self.out)
+        self.assertEqual(self.out.getvalue(), return_string)
 
     def test_basic_files_single(self):
         tname = 'regular.torrent'
@@ -698,6 +778,19 @@ class PrintableTest(unittest.TestCase):
         torrentinfo.dump(test_string, self.config, 0, newline=False)
         self.assertFalse(p)
 
+    def test_is_ascii_large_binary_false(self):
+        test_string = '\x00' * 8192
+        self.assertFalse(torrentinfo.is_ascii_only(test_string))
+
+    def test_is_ascii_large_late_binary_false(self):
+        test_string = 'a' * 8192 + '\x00'
+        self.assertFalse(torrentinfo.is_ascii_only(test_string))
+
+    def test_dump_large_string(self):
+        test_string = 'a' * 100000
+        torrentinfo.dump(test_string, self.config, 1)
+        self.assertEqual(self.out.getvalue(),
+                         self.config.tab_char + test_string + '\n')
 
     def test_is_printable_ascii_success(self):
         test_string = 'perfectly printable ascii'